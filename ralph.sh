@@ -73,44 +73,63 @@ PROGRESS_FILE="$SCRIPT_DIR/progress.txt"
 ARCHIVE_DIR="$SCRIPT_DIR/archive"
 LAST_BRANCH_FILE="$SCRIPT_DIR/.last-branch"
 
-# Archive previous run if branch changed
-if [ -f "$PRD_FILE" ] && [ -f "$LAST_BRANCH_FILE" ]; then
-  CURRENT_BRANCH=$(jq -r '.branchName // empty' "$PRD_FILE" 2>/dev/null || echo "")
-  LAST_BRANCH=$(cat "$LAST_BRANCH_FILE" 2>/dev/null || echo "")
-
-  if [ -n "$CURRENT_BRANCH" ] && [ -n "$LAST_BRANCH" ] && [ "$CURRENT_BRANCH" != "$LAST_BRANCH" ]; then
-    # Archive the previous run
-    DATE=$(date +%Y-%m-%d)
-    # Strip "ralph/" prefix from branch name for folder
-    FOLDER_NAME=$(echo "$LAST_BRANCH" | sed 's|^ralph/||')
-    ARCHIVE_FOLDER="$ARCHIVE_DIR/$DATE-$FOLDER_NAME"
-
-    echo "Archiving previous run: $LAST_BRANCH"
-    mkdir -p "$ARCHIVE_FOLDER"
-    [ -f "$PRD_FILE" ] && cp "$PRD_FILE" "$ARCHIVE_FOLDER/"
-    [ -f "$PROGRESS_FILE" ] && cp "$PROGRESS_FILE" "$ARCHIVE_FOLDER/"
-    echo "   Archived to: $ARCHIVE_FOLDER"
-
-    # Reset progress file for new run
-    echo "# Ralph Progress Log" > "$PROGRESS_FILE"
-    echo "Started: $(date)" >> "$PROGRESS_FILE"
-    echo "---" >> "$PROGRESS_FILE"
+# Function to write a fresh progress log header
+init_progress_file() {
+  {
+    echo "# Ralph Progress Log"
+    echo "Started: $(date)"
+    echo "---"
+  } > "$PROGRESS_FILE"
+}
+
+# Function to archive the previous run's PRD and progress, then reset progress
+archive_previous_run() {
+  local last_branch="$1"
+  local date=$(date +%Y-%m-%d)
+  # Strip "ralph/" prefix from branch name for folder
+  local folder_name="${last_branch#ralph/}"
+  local archive_folder="$ARCHIVE_DIR/$date-$folder_name"
+
+  echo "Archiving previous run: $last_branch"
+  mkdir -p "$archive_folder"
+  cp "$PRD_FILE" "$archive_folder/"
+  if [ -f "$PROGRESS_FILE" ]; then
+    cp "$PROGRESS_FILE" "$archive_folder/"
   fi
-fi
+  echo "   Archived to: $archive_folder"
+
+  # Reset progress file for new run
+  init_progress_file
+}
 
-# Track current branch
-if [ -f "$PRD_FILE" ]; then
-  CURRENT_BRANCH=$(jq -r '.branchName // empty' "$PRD_FILE" 2>/dev/null || echo "")
-  if [ -n "$CURRENT_BRANCH" ]; then
-    echo "$CURRENT_BRANCH" > "$LAST_BRANCH_FILE"
+# Function to archive the previous run if the PRD branch changed, then track the current branch
+archive_if_branch_changed() {
+  # Read the PRD branch once; archiving and branch tracking both use it
+  local current_branch=""
+  if [ -f "$PRD_FILE" ]; then
+    current_branch=$(jq -r '.branchName // empty' "$PRD_FILE" 2>/dev/null || echo "")
+  fi
+  if [ -z "$current_branch" ]; then
+    return 0
   fi
-fi
+
+  if [ -f "$LAST_BRANCH_FILE" ]; then
+    local last_branch=""
+    read -r last_branch < "$LAST_BRANCH_FILE" || true
+    if [ -n "$last_branch" ] && [ "$current_branch" != "$last_branch" ]; then
+      archive_previous_run "$last_branch"
+    fi
+  fi
+
+  # Track current branch
+  echo "$current_branch" > "$LAST_BRANCH_FILE"
+}
+
+archive_if_branch_changed
 
 # Initialize progress file if it doesn't exist
 if [ ! -f "$PROGRESS_FILE" ]; then
-  echo "# Ralph Progress Log" > "$PROGRESS_FILE"
-  echo "Started: $(date)" >> "$PROGRESS_FILE"
-  echo "---" >> "$PROGRESS_FILE"
+  init_progress_file
 fi
 
 # Circuit breaker: track attempts per story
@@ -122,10 +141,14 @@ if [ ! -f "$ATTEMPTS_FILE" ]; then
   echo "{}" > "$ATTEMPTS_FILE"
 fi
 
-# Function to get current story being worked on
+# Function to get current story being worked on (highest priority incomplete story)
+# Stories already skipped by the circuit breaker are excluded
 get_current_story() {
   if [ -f "$PRD_FILE" ]; then
-    jq -r '.userStories[] | select(.passes == false) | .id' "$PRD_FILE" 2>/dev/null | head -1
+    jq -r '
+      [.userStories[] | select(.passes == false and ((.notes // "") | startswith("Skipped:") | not))]
+      | min_by(.priority // 999) | .id // empty
+    ' "$PRD_FILE" 2>/dev/null || echo ""
   fi
 }
 
@@ -140,7 +163,10 @@ increment_story_attempts() {
   local story_id="$1"
   local current=$(get_story_attempts "$story_id")
   local new_count=$((current + 1))
-  jq --arg id "$story_id" --argjson count "$new_count" '.[$id] = $count' "$ATTEMPTS_FILE" > "$ATTEMPTS_FILE.tmp" && mv "$ATTEMPTS_FILE.tmp" "$ATTEMPTS_FILE"
+  jq --arg id "$story_id" --argjson count "$new_count" '.[$id] = $count' "$ATTEMPTS_FILE" > "$ATTEMPTS_FILE.tmp" && mv "$ATTEMPTS_FILE.tmp" "$ATTEMPTS_FILE" || {
+    rm -f "$ATTEMPTS_FILE.tmp"
+    echo "WARNING: Failed to record attempt $new_count for $story_id in $ATTEMPTS_FILE" >&2
+  }
   echo "$new_count"
 }
 
@@ -151,18 +177,25 @@ mark_story_skipped() {
   local note="Skipped: exceeded $max_attempts attempts without passing"
   jq --arg id "$story_id" --arg note "$note" '
     .userStories = [.userStories[] | if .id == $id then .notes = $note else . end]
-  ' "$PRD_FILE" > "$PRD_FILE.tmp" && mv "$PRD_FILE.tmp" "$PRD_FILE"
+  ' "$PRD_FILE" > "$PRD_FILE.tmp" && mv "$PRD_FILE.tmp" "$PRD_FILE" || {
+    rm -f "$PRD_FILE.tmp"
+    echo "Circuit breaker: Failed to mark story $story_id as skipped in $PRD_FILE" >&2
+    return 1
+  }
   echo "Circuit breaker: Marked story $story_id as skipped after $max_attempts attempts"
 }
 
 # Function to check and apply circuit breaker
+# Pass the attempt count as $2 when already known to skip re-reading the attempts file
 check_circuit_breaker() {
   local story_id="$1"
-  local attempts=$(get_story_attempts "$story_id")
+  local attempts="${2:-$(get_story_attempts "$story_id")}"
 
   if [ "$attempts" -ge "$MAX_ATTEMPTS_PER_STORY" ]; then
     echo "Circuit breaker: Story $story_id has reached max attempts ($attempts/$MAX_ATTEMPTS_PER_STORY)"
-    mark_story_skipped "$story_id" "$MAX_ATTEMPTS_PER_STORY"
+    if ! mark_story_skipped "$story_id" "$MAX_ATTEMPTS_PER_STORY"; then
+      return 2  # tripped, but the skip could not be recorded in the PRD
+    fi
     return 0  # true - circuit breaker tripped
   fi
   return 1  # false - circuit breaker not tripped
@@ -183,7 +216,7 @@ for i in $(seq 1 $MAX_ITERATIONS); do
     # Check if this is the same story as last iteration (consecutive failure detection)
     LAST_STORY=""
     if [ -f "$LAST_STORY_FILE" ]; then
-      LAST_STORY=$(cat "$LAST_STORY_FILE" 2>/dev/null || echo "")
+      read -r LAST_STORY < "$LAST_STORY_FILE" || true
     fi
 
     if [ "$CURRENT_STORY" == "$LAST_STORY" ]; then
@@ -191,8 +224,14 @@ for i in $(seq 1 $MAX_ITERATIONS); do
       ATTEMPTS=$(increment_story_attempts "$CURRENT_STORY")
       echo "Attempts on $CURRENT_STORY: $ATTEMPTS/$MAX_ATTEMPTS_PER_STORY"
 
-      # Check circuit breaker
-      if check_circuit_breaker "$CURRENT_STORY"; then
+      # Check circuit breaker (0 = tripped, 1 = not tripped, 2 = tripped but not recorded)
+      BREAKER_STATUS=0
+      check_circuit_breaker "$CURRENT_STORY" "$ATTEMPTS" || BREAKER_STATUS=$?
+      if [ "$BREAKER_STATUS" -eq 2 ]; then
+        echo "Circuit breaker: Story $CURRENT_STORY could not be marked skipped in $PRD_FILE; needs human review."
+        echo "Stopping to avoid further attempts on a story over its limit."
+        exit 1
+      elif [ "$BREAKER_STATUS" -eq 0 ]; then
         echo "Skipping to next story..."
         echo "$CURRENT_STORY" > "$LAST_STORY_FILE"
         sleep 1
@@ -200,15 +239,21 @@ for i in $(seq 1 $MAX_ITERATIONS); do
       fi
     else
       # New story, record first attempt
-      if [ -n "$CURRENT_STORY" ]; then
-        ATTEMPTS=$(increment_story_attempts "$CURRENT_STORY")
-        echo "Starting story: $CURRENT_STORY (attempt $ATTEMPTS/$MAX_ATTEMPTS_PER_STORY)"
-      fi
+      ATTEMPTS=$(increment_story_attempts "$CURRENT_STORY")
+      echo "Starting story: $CURRENT_STORY (attempt $ATTEMPTS/$MAX_ATTEMPTS_PER_STORY)"
     fi
 
     # Record current story for next iteration
     echo "$CURRENT_STORY" > "$LAST_STORY_FILE"
   else
+    # Any stories still failing here were all skipped by the circuit breaker
+    SKIPPED_STORIES=$(jq -r '.userStories[] | select(.passes == false) | "  - \(.id)"' "$PRD_FILE" 2>/dev/null || echo "")
+    if [ -n "$SKIPPED_STORIES" ]; then
+      echo "All remaining stories skipped by circuit breaker; needs human review:"
+      echo "$SKIPPED_STORIES"
+      echo "Check $PROGRESS_FILE and the story notes in $PRD_FILE before re-running."
+      exit 1
+    fi
     echo "No incomplete stories found"
   fi
 
@@ -216,12 +261,12 @@ for i in $(seq 1 $MAX_ITERATIONS); do
   OUTPUT=$(claude --dangerously-skip-permissions --print < "$SCRIPT_DIR/CLAUDE.md" 2>&1 | tee /dev/stderr) || true
 
   # Check for completion signal
-  if echo "$OUTPUT" | grep -q "<promise>COMPLETE</promise>"; then
+  if [[ "$OUTPUT" == *"<promise>COMPLETE</promise>"* ]]; then
     echo ""
     echo "COMPLETE signal received. Verifying all stories pass..."
 
     # Verify all stories actually have passes:true
-    INCOMPLETE_STORIES=$(jq -r '.userStories[] | select(.passes == false) | .id' "$PRD_FILE" 2>/dev/null || echo "")
+    INCOMPLETE_STORIES=$(jq -r '.userStories[] | select(.passes == false) | "  - \(.id)"' "$PRD_FILE" 2>/dev/null || echo "")
 
     if [ -z "$INCOMPLETE_STORIES" ]; then
       echo "Verification passed: All stories have passes:true"
@@ -233,9 +278,7 @@ for i in $(seq 1 $MAX_ITERATIONS); do
       echo ""
       echo "WARNING: COMPLETE claimed but verification failed!"
       echo "The following stories still have passes:false:"
-      echo "$INCOMPLETE_STORIES" | while read -r story_id; do
-        echo "  - $story_id"
-      done
+      echo "$INCOMPLETE_STORIES"
       echo ""
       echo "Continuing iteration to fix incomplete stories..."
     fi
@@ -44,6 +44,8 @@ teardown() {
   # Should NOT exit successfully - should continue or fail
   [[ "$output" == *"WARNING: COMPLETE claimed but verification failed"* ]] || \
   [[ "$output" == *"still have passes:false"* ]]
+  [[ "$output" == *"  - US-001"* ]]
+  [[ "$output" == *"  - US-002"* ]]
 }
 
 @test "Detects consecutive failures on same story" {
@@ -100,6 +102,69 @@ teardown() {
   [[ "$output" == *"max attempts"* ]]
 }
 
+@test "Moves on to next story after circuit breaker skip" {
+  cp "$BATS_TEST_DIRNAME/fixtures/prd_incomplete.json" "$TEST_DIR/prd.json"
+  create_mock_claude_continue "Working..."
+
+  echo "US-001" > "$TEST_DIR/.last-story"
+  echo '{"US-001": 5}' > "$TEST_DIR/.story-attempts"
+  export MAX_ATTEMPTS_PER_STORY=5
+
+  run bash "$TEST_DIR/ralph.sh" 2 --skip-security-check
+
+  [[ "$output" == *"Marked story US-001 as skipped"* ]]
+  [[ "$output" == *"Starting story: US-002"* ]]
+}
+
+@test "Stops without running claude when a tripped story cannot be marked skipped" {
+  cp "$BATS_TEST_DIRNAME/fixtures/prd_incomplete.json" "$TEST_DIR/prd.json"
+  create_mock_claude_counter
+
+  echo "US-001" > "$TEST_DIR/.last-story"
+  echo '{"US-001": 5}' > "$TEST_DIR/.story-attempts"
+  export MAX_ATTEMPTS_PER_STORY=5
+  # A directory in place of the temp file makes the PRD rewrite fail
+  mkdir "$TEST_DIR/prd.json.tmp"
+
+  run bash "$TEST_DIR/ralph.sh" 3 --skip-security-check
+
+  [ "$status" -eq 1 ]
+  [[ "$output" == *"could not be marked skipped"* ]]
+  [[ "$output" == *"needs human review"* ]]
+  [[ "$output" != *"Skipping to next story"* ]]
+  [ "$(get_claude_call_count)" = "0" ]
+}
+
+@test "Stops when all remaining stories were skipped by circuit breaker" {
+  create_prd '{
+    "branchName": "ralph/test-feature",
+    "userStories": [
+      {"id": "US-001", "priority": 1, "passes": false, "notes": "Skipped: exceeded 5 attempts without passing"}
+    ]
+  }'
+  create_mock_claude_counter
+
+  run bash "$TEST_DIR/ralph.sh" 3 --skip-security-check
+
+  [ "$status" -eq 1 ]
+  [[ "$output" == *"All remaining stories skipped by circuit breaker; needs human review"* ]]
+  [[ "$output" == *"  - US-001"* ]]
+  [[ "$output" != *"No incomplete stories found"* ]]
+  [ "$(get_claude_call_count)" = "0" ]
+}
+
+@test "Keeps looping when prd.json is malformed" {
+  echo '{"userStories": [' > "$TEST_DIR/prd.json"
+  create_mock_claude_counter
+
+  run bash "$TEST_DIR/ralph.sh" 2 --skip-security-check
+
+  [ "$status" -eq 1 ]
+  [[ "$output" == *"Ralph Iteration 2"* ]]
+  [[ "$output" == *"reached max iterations"* ]]
+  [ "$(get_claude_call_count)" = "2" ]
+}
+
 @test "Initializes progress file if missing" {
   cp "$BATS_TEST_DIRNAME/fixtures/prd_complete.json" "$TEST_DIR/prd.json"
   create_mock_claude_complete
@@ -138,3 +203,39 @@ teardown() {
   [[ "$output" == *"Ralph Iteration 1"* ]]
   [[ "$output" == *"Starting Ralph"* ]]
 }
+
+@test "Archives previous run when PRD branch differs from .last-branch" {
+  cp "$BATS_TEST_DIRNAME/fixtures/prd_branch_change.json" "$TEST_DIR/prd.json"
+  # Mark the only story passing so the run completes in one iteration
+  jq '.userStories[0].passes = true' "$TEST_DIR/prd.json" > "$TEST_DIR/prd.json.tmp" && mv "$TEST_DIR/prd.json.tmp" "$TEST_DIR/prd.json"
+  create_mock_claude_complete
+  echo "ralph/old-feature" > "$TEST_DIR/.last-branch"
+  echo "Old progress that should be archived" > "$TEST_DIR/progress.txt"
+
+  run bash "$TEST_DIR/ralph.sh" 1 --skip-security-check
+
+  [ "$status" -eq 0 ]
+  [[ "$output" == *"Archiving previous run: ralph/old-feature"* ]]
+
+  archive_folder=$(ls -d "$TEST_DIR/archive/"*-old-feature 2>/dev/null | head -1)
+  [ -n "$archive_folder" ]
+  [ -f "$archive_folder/prd.json" ]
+  [ "$(cat "$archive_folder/progress.txt")" = "Old progress that should be archived" ]
+
+  progress_content=$(cat "$TEST_DIR/progress.txt")
+  [[ "$progress_content" == "# Ralph Progress Log"* ]]
+  [[ "$progress_content" != *"Old progress that should be archived"* ]]
+  [ "$(cat "$TEST_DIR/.last-branch")" = "ralph/new-branch" ]
+}
+
+@test "Records PRD branchName in .last-branch" {
+  cp "$BATS_TEST_DIRNAME/fixtures/prd_complete.json" "$TEST_DIR/prd.json"
+  create_mock_claude_complete
+
+  rm -f "$TEST_DIR/.last-branch"
+
+  run bash "$TEST_DIR/ralph.sh" 1 --skip-security-check
+
+  [ "$status" -eq 0 ]
+  [ "$(cat "$TEST_DIR/.last-branch")" = "ralph/test-feature" ]
+}
@@ -29,6 +29,44 @@ teardown() {
   [ -z "$result" ]
 }
 
+@test "get_current_story returns highest priority failing story" {
+  create_prd '{
+    "branchName": "ralph/test-feature",
+    "userStories": [
+      {"id": "US-001", "priority": 3, "passes": false, "notes": ""},
+      {"id": "US-002", "priority": 1, "passes": true, "notes": ""},
+      {"id": "US-003", "priority": 2, "passes": false, "notes": ""}
+    ]
+  }'
+  source_ralph_functions
+
+  result=$(get_current_story)
+  [ "$result" = "US-003" ]
+}
+
+@test "get_current_story ignores stories skipped by circuit breaker" {
+  cp "$BATS_TEST_DIRNAME/fixtures/prd_incomplete.json" "$TEST_DIR/prd.json"
+  source_ralph_functions
+
+  mark_story_skipped "US-001" 5
+
+  result=$(get_current_story)
+  [ "$result" = "US-002" ]
+}
+
+@test "get_current_story handles null notes" {
+  create_prd '{
+    "branchName": "ralph/test-feature",
+    "userStories": [
+      {"id": "US-001", "priority": 1, "passes": false, "notes": null}
+    ]
+  }'
+  source_ralph_functions
+
+  result=$(get_current_story)
+  [ "$result" = "US-001" ]
+}
+
 @test "get_story_attempts returns 0 for new story" {
   echo '{}' > "$TEST_DIR/.story-attempts"
   source_ralph_functions
@@ -91,6 +129,16 @@ teardown() {
   [ "$status" -eq 1 ]  # 1 = false, circuit breaker not tripped
 }
 
+@test "circuit breaker uses provided attempt count" {
+  cp "$BATS_TEST_DIRNAME/fixtures/prd_incomplete.json" "$TEST_DIR/prd.json"
+  echo '{"US-001": 1}' > "$TEST_DIR/.story-attempts"
+  export MAX_ATTEMPTS_PER_STORY=5
+  source_ralph_functions
+
+  run check_circuit_breaker "US-001" 5
+  [ "$status" -eq 0 ]  # tripped on the passed count, not the stored one
+}
+
 @test "mark_story_skipped adds notes to PRD" {
   cp "$BATS_TEST_DIRNAME/fixtures/prd_incomplete.json" "$TEST_DIR/prd.json"
   source_ralph_functions
@@ -116,3 +164,33 @@ teardown() {
   us002_passes=$(jq -r '.userStories[] | select(.id == "US-002") | .passes' "$TEST_DIR/prd.json")
   [ "$us002_passes" = "false" ]
 }
+
+@test "mark_story_skipped leaves PRD untouched when it is not valid JSON" {
+  echo '{"userStories": [' > "$TEST_DIR/prd.json"
+  source_ralph_functions
+
+  run mark_story_skipped "US-001" 5
+  [ "$status" -eq 1 ]
+  [ "$(cat "$TEST_DIR/prd.json")" = '{"userStories": [' ]
+  [ ! -f "$TEST_DIR/prd.json.tmp" ]
+}
+
+@test "circuit breaker returns 2 when the story cannot be marked skipped" {
+  echo '{"userStories": [' > "$TEST_DIR/prd.json"
+  echo '{"US-001": 5}' > "$TEST_DIR/.story-attempts"
+  export MAX_ATTEMPTS_PER_STORY=5
+  source_ralph_functions
+
+  run check_circuit_breaker "US-001"
+  [ "$status" -eq 2 ]  # 2 = tripped, but skip not recorded
+  [[ "$output" == *"Failed to mark story US-001 as skipped"* ]]
+}
+
+@test "increment_story_attempts warns when the attempts file cannot be updated" {
+  echo 'not json' > "$TEST_DIR/.story-attempts"
+  source_ralph_functions
+
+  run increment_story_attempts "US-001"
+  [[ "$output" == *"WARNING: Failed to record attempt 1 for US-001"* ]]
+  [ ! -f "$TEST_DIR/.story-attempts.tmp" ]
+}
@@ -80,12 +80,8 @@ source_ralph_functions() {
   export LAST_STORY_FILE="$TEST_DIR/.last-story"
   export MAX_ATTEMPTS_PER_STORY="${MAX_ATTEMPTS_PER_STORY:-5}"
 
-  # Source the function definitions
-  eval "$(sed -n '/^get_current_story()/,/^}/p' "$RALPH_SCRIPT")"
-  eval "$(sed -n '/^get_story_attempts()/,/^}/p' "$RALPH_SCRIPT")"
-  eval "$(sed -n '/^increment_story_attempts()/,/^}/p' "$RALPH_SCRIPT")"
-  eval "$(sed -n '/^mark_story_skipped()/,/^}/p' "$RALPH_SCRIPT")"
-  eval "$(sed -n '/^check_circuit_breaker()/,/^}/p' "$RALPH_SCRIPT")"
+  # Source every top-level function definition in a single pass
+  eval "$(sed -n '/^[a-z_][a-z_]*() {/,/^}/p' "$RALPH_SCRIPT")"
 }
 
 # Run ralph.sh with arguments in test directory